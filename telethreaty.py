@@ -5,24 +5,173 @@ telethreaty - Advanced Telegram message fetcher with permission management
 
 import argparse
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import os
+import re
+import socket
 import time
 import pprint
-import multiprocessing
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import mimetypes
+import shutil
 import json
+try:
+    import orjson
+except ImportError:
+    orjson = None
 from datetime import datetime
 import sys
-from pathlib import Path
+from collections import namedtuple
+from operator import attrgetter, itemgetter
+
+# Cached API results per bot token, shared by every TeleThreaty instance using that token.
+# Entries hold their fetch time, so each instance applies its own cache_ttl when reading them.
+_RESPONSE_CACHE = {}
+
+# Longest TTL any instance has configured per API method, per bot token.
+# Pruning only evicts entries past it, so no instance loses an entry it still considers fresh.
+_CACHE_MAX_TTL = {}
+
+def _loads(content):
+    """Decode a JSON response body, using orjson when it is installed"""
+    return orjson.loads(content) if orjson else json.loads(content)
+
+class MessageRecord(namedtuple('MessageRecord', ['update_id', 'chat_id', 'message_id', 'date', 'text',
+                                                 'user', 'is_bot', 'direction', 'raw'])):
+    """The fields of a fetched message that the display and archive code read"""
+    __slots__ = ()
+    
+    def to_archive(self):
+        """Archive layout, kept compatible with earlier messages.json files"""
+        return {
+            'update_id': self.update_id,
+            'message': self.raw,
+            'timestamp': self.date,
+            'is_bot': self.is_bot,
+            'direction': self.direction
+        }
+
+class RateLimiter:
+    """Token buckets for Telegram's global and per-chat sending limits"""
+    
+    def __init__(self, global_rate=30, global_period=1.0, per_chat_rate=20, per_chat_period=60.0):
+        self.global_rate = global_rate
+        self.global_period = global_period
+        self.per_chat_rate = per_chat_rate
+        self.per_chat_period = per_chat_period
+        self._cond = threading.Condition()
+        self._global_bucket = [float(global_rate), time.monotonic()]
+        self._chat_buckets = {}
+        self._paused_until = 0.0
+    
+    @staticmethod
+    def _refill(bucket, rate, period, now):
+        """Top up a [tokens, last_refill] bucket and return seconds until one token is available"""
+        tokens, last = bucket
+        bucket[0] = min(float(rate), tokens + max(0.0, now - last) * rate / period)
+        bucket[1] = max(now, last)
+        return 0.0 if bucket[0] >= 1 else (1 - bucket[0]) * period / rate
+    
+    def acquire(self, chat_id=None):
+        """Block until both the global and the chat's bucket have a token, then take them"""
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                wait = self._paused_until - now
+                if wait <= 0:
+                    wait = self._refill(self._global_bucket, self.global_rate, self.global_period, now)
+                    chat_bucket = None
+                    if chat_id is not None:
+                        chat_bucket = self._chat_buckets.setdefault(str(chat_id), [float(self.per_chat_rate), now])
+                        wait = max(wait, self._refill(chat_bucket, self.per_chat_rate, self.per_chat_period, now))
+                    if wait <= 0:
+                        self._global_bucket[0] -= 1
+                        if chat_bucket is not None:
+                            chat_bucket[0] -= 1
+                        return
+                self._cond.wait(wait)
+    
+    def pause(self, seconds):
+        """Halt all sending for the retry_after period Telegram asked for"""
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            # No tokens accrue during the pause; buckets keep what they had and refill afterwards
+            for bucket in [self._global_bucket, *self._chat_buckets.values()]:
+                bucket[1] = max(bucket[1], self._paused_until)
+            self._cond.notify_all()
 
 class TeleThreaty:
-    def __init__(self, token, timeout=30, download_dir="downloads"):
+    # Bot API methods wrapped by _call: name -> (HTTP verb, rate-limit scope).
+    # Sends count against the global and per-chat limits, deletions only the global one.
+    API_METHODS = {
+        'getMe': ('GET', None),
+        'getChat': ('POST', None),
+        'getChatMember': ('POST', None),
+        'getChatAdministrators': ('POST', None),
+        'getChatMemberCount': ('POST', None),
+        'getMyCommands': ('GET', None),
+        'getMyDefaultAdministratorRights': ('GET', None),
+        'sendMessage': ('POST', 'chat'),
+        'deleteMessage': ('POST', 'global'),
+    }
+    
+    # Upload method for each file type send_file can pick
+    FILE_SEND_METHODS = {
+        'document': 'sendDocument',
+        'photo': 'sendPhoto',
+        'audio': 'sendAudio',
+        'video': 'sendVideo',
+        'animation': 'sendAnimation',
+        'voice': 'sendVoice',
+        'video_note': 'sendVideoNote'
+    }
+    
+    # Anything other than letters, digits, '.', '_', '-' and spaces is stripped from saved filenames
+    _UNSAFE_FILENAME_CHARS = re.compile(r'[^\w.\- ]+')
+    
+    # Seconds between sweeps of expired entries out of the shared response cache
+    _CACHE_PRUNE_INTERVAL = 60
+    
+    def __init__(self, token, timeout=30, download_dir="downloads", cache_ttl=None, connect_timeout=3.05):
         self.token = token
-        self.timeout = timeout
+        # (connect, read): fail fast on unreachable hosts while leaving room for slow replies
+        self.timeout = (connect_timeout, timeout)
         self.base_url = f"https://api.telegram.org/bot{token}"
+        self.file_base_url = f"https://api.telegram.org/file/bot{token}"
+        self._urls = {name: f"{self.base_url}/{name}"
+                      for name in (*self.API_METHODS, *self.FILE_SEND_METHODS.values(), "getUpdates", "getFile")}
         self.download_dir = download_dir
         os.makedirs(download_dir, exist_ok=True)
         
+        # Reuse keep-alive connections to api.telegram.org across all calls
+        self.session = requests.Session()
+        retries = Retry(total=5, backoff_factor=0.3,
+                        status_forcelist=[429, 500, 502, 503, 504],
+                        respect_retry_after_header=True)
+        self.session.mount("https://", HTTPAdapter(pool_connections=32, pool_maxsize=64,
+                                                   max_retries=retries))
+        
+        # Pace outgoing writes to stay under Telegram's flood limits
+        self._rate = RateLimiter()
+        
+        # Seconds to keep read-only API results; getFile paths stay valid for about an hour
+        self.cache_ttl = {'getMe': 300, 'getChat': 60, 'getChatMember': 60, 'getFile': 3000}
+        self.cache_ttl.update(cache_ttl or {})
+        self._cache = _RESPONSE_CACHE.setdefault(token, {})
+        self._cache_max_ttl = _CACHE_MAX_TTL.setdefault(token, {})
+        for endpoint, ttl in self.cache_ttl.items():
+            self._cache_max_ttl[endpoint] = max(ttl, self._cache_max_ttl.get(endpoint, 0))
+        self._next_cache_prune = 0.0
+        # Privacy-mode flag from getMe, filled in by can_read_all after the first successful call
+        self._can_read_all = None
+        
+        # Newest message_id seen per chat, kept even after monitoring acknowledges the updates
+        self._latest_message_ids = {}
+        # Sends from pool threads update it concurrently; the compare-and-store must not interleave
+        self._latest_message_lock = threading.Lock()
+        
         # File type categories for better organization
         self.file_categories = {
             'archive': ['.zip', '.7z', '.rar', '.tar', '.gz', '.gzip', '.bz2', '.xz', '.lzh', '.iso'],
@@ -36,77 +185,120 @@ class TeleThreaty:
             'executable': ['.exe', '.msi', '.dmg', '.pkg', '.deb', '.rpm', '.apk'],
             'config': ['.json', '.xml', '.yaml', '.yml', '.ini', '.conf', '.cfg']
         }
+        self._ext_to_category = {ext: category for category, extensions in self.file_categories.items()
+                                 for ext in extensions}
+    
+    def _cached(self, key, fetch):
+        """Return the cached result for key, calling fetch() on a miss or once its TTL expires"""
+        now = time.monotonic()
+        entry = self._cache.get(key)
+        if entry and now - entry[0] < self.cache_ttl.get(key[0], 0):
+            return entry[1]
+        
+        # Sweep expired entries now and then so one-off keys such as getFile ids don't pile up
+        if now >= self._next_cache_prune:
+            self._next_cache_prune = now + self._CACHE_PRUNE_INTERVAL
+            self._prune_cache(now)
+        
+        value = fetch()
+        # Only successful lookups are worth remembering
+        if value and (not isinstance(value, dict) or value.get('ok')):
+            self._cache[key] = (now, value)
+        return value
+    
+    def _prune_cache(self, now):
+        """Drop cached entries that have outlived every instance's TTL for their method"""
+        for key, (fetched_at, _) in list(self._cache.items()):
+            if now - fetched_at >= self._cache_max_ttl.get(key[0], 0):
+                self._cache.pop(key, None)
+    
+    def invalidate_cache(self, *endpoints):
+        """Forget cached results for the given API methods, or for all of them
+        
+        The results are shared with other instances for the same token, but only this
+        instance's can_read_all is reset; other instances keep their value until rebuilt.
+        """
+        for key in list(self._cache):
+            if not endpoints or key[0] in endpoints:
+                self._cache.pop(key, None)
+        if not endpoints or 'getMe' in endpoints:
+            self._can_read_all = None
+    
+    def _call(self, endpoint, **params):
+        """Call a Bot API method, serving cacheable reads from the TTL cache"""
+        # Only unthrottled read methods are cached; a TTL set for a send or delete is ignored
+        if self.API_METHODS[endpoint][1] is None and endpoint in self.cache_ttl:
+            key = (endpoint, *(str(value) for value in params.values()))
+            return self._cached(key, lambda: self._request(endpoint, params))
+        return self._request(endpoint, params)
+    
+    def _request(self, endpoint, params, attempts=3):
+        """Send a rate-limited API request, retrying after 429 flood waits"""
+        method, scope = self.API_METHODS[endpoint]
+        for attempt in range(attempts):
+            if scope == 'chat':
+                self._rate.acquire(params.get('chat_id'))
+            elif scope or attempt:
+                # Retries after a 429 wait out the pause even for read-only calls
+                self._rate.acquire()
+            
+            try:
+                response = self.session.request(method, self._urls[endpoint], data=params or None,
+                                                timeout=self.timeout)
+                data = _loads(response.content)
+            except Exception as e:
+                return {'ok': False, 'error': str(e)}
+            
+            if data.get('error_code') != 429:
+                break
+            self._check_flood_wait(data)
+        return data
     
     def get_bot_info(self):
         """Get bot information"""
-        try:
-            response = requests.get(f"{self.base_url}/getMe", timeout=self.timeout)
-            return response.json()
-        except Exception as e:
-            return {'ok': False, 'error': str(e)}
+        return self._call("getMe")
+    
+    @property
+    def can_read_all(self):
+        """Whether privacy mode is disabled, i.e. the bot sees every group message"""
+        if self._can_read_all is None:
+            bot_info = self.get_bot_info()
+            if not bot_info.get('ok'):
+                # Don't pin the flag on a failed getMe; ask again on the next read
+                return False
+            self._can_read_all = bot_info['result'].get('can_read_all_group_messages', False)
+        return self._can_read_all
     
     def get_chat_info(self, chat_id):
         """Get detailed chat information"""
-        url = f"{self.base_url}/getChat"
-        data = {"chat_id": chat_id}
-        try:
-            response = requests.post(url, data=data, timeout=self.timeout)
-            return response.json()
-        except Exception as e:
-            return {'ok': False, 'error': str(e)}
+        return self._call("getChat", chat_id=chat_id)
     
     def get_chat_member(self, chat_id, user_id):
         """Get chat member info including permissions"""
-        url = f"{self.base_url}/getChatMember"
-        data = {"chat_id": chat_id, "user_id": user_id}
-        try:
-            response = requests.post(url, data=data, timeout=self.timeout)
-            return response.json()
-        except Exception as e:
-            return {'ok': False, 'error': str(e)}
+        return self._call("getChatMember", chat_id=chat_id, user_id=user_id)
     
     def get_chat_administrators(self, chat_id):
         """Get chat administrators"""
-        url = f"{self.base_url}/getChatAdministrators"
-        data = {"chat_id": chat_id}
-        try:
-            response = requests.post(url, data=data, timeout=self.timeout)
-            return response.json()
-        except Exception as e:
-            return {'ok': False, 'error': str(e)}
+        return self._call("getChatAdministrators", chat_id=chat_id)
     
     def get_chat_member_count(self, chat_id):
         """Get chat member count"""
-        url = f"{self.base_url}/getChatMemberCount"
-        data = {"chat_id": chat_id}
-        try:
-            response = requests.post(url, data=data, timeout=self.timeout)
-            return response.json()
-        except Exception as e:
-            return {'ok': False, 'error': str(e)}
+        return self._call("getChatMemberCount", chat_id=chat_id)
     
     def get_my_commands(self, chat_id):
         """Get bot commands"""
-        url = f"{self.base_url}/getMyCommands"
-        data = {"chat_id": chat_id}
-        try:
-            response = requests.get(url, data=data, timeout=self.timeout)
-            return response.json()
-        except Exception as e:
-            return {'ok': False, 'error': str(e)}
+        return self._call("getMyCommands", chat_id=chat_id)
     
     def get_my_default_admin_rights(self, chat_id):
         """Get default admin rights"""
-        url = f"{self.base_url}/getMyDefaultAdministratorRights"
-        data = {"chat_id": chat_id}
-        try:
-            response = requests.get(url, data=data, timeout=self.timeout)
-            return response.json()
-        except Exception as e:
-            return {'ok': False, 'error': str(e)}
+        return self._call("getMyDefaultAdministratorRights", chat_id=chat_id)
     
-    def check_bot_permissions(self, chat_id):
+    def check_bot_permissions(self, chat_id, refresh=False):
         """Check what permissions the bot has"""
+        # Served from the getMe/getChatMember cache unless the user asked for a fresh check
+        if refresh:
+            self.invalidate_cache('getMe', 'getChatMember')
+        
         print("\n" + "="*50)
         print("          BOT PERMISSION CHECK")
         print("="*50)
@@ -158,16 +350,15 @@ class TeleThreaty:
             return chat_info['result'].get('type')
         return None
     
-    def get_all_updates(self, limit=100, offset=0):
-        """Get ALL available updates including historical ones"""
-        url = f"{self.base_url}/getUpdates"
-        all_updates = []
+    def iter_updates(self, limit=100, offset=0, quiet=False):
+        """Yield ALL available updates including historical ones, one page at a time"""
+        url = self._urls["getUpdates"]
+        fetched = 0
         
         # Check permissions first
-        bot_info = self.get_bot_info()
-        can_read_all = bot_info.get('result', {}).get('can_read_all_group_messages', False)
+        can_read_all = self.can_read_all
         
-        if not can_read_all:
+        if not can_read_all and not quiet:
             print("⚠️  Warning: Bot privacy mode is enabled")
             print("📝 The bot can only see:")
             print("   - Commands (starting with /)")
@@ -176,109 +367,133 @@ class TeleThreaty:
             print("💡 Use /setprivacy -> Disable with @BotFather to see all messages")
         
         try:
-            while True:
+            while fetched < limit:
                 params = {
                     'offset': offset,
-                    'limit': min(100, limit - len(all_updates)),
-                    'timeout': 5
+                    'limit': min(100, limit - fetched),
+                    'timeout': 0
                 }
                 
-                response = requests.get(url, params=params, timeout=self.timeout)
-                data = response.json()
+                response = self.session.get(url, params=params, timeout=self.timeout)
+                data = _loads(response.content)
                 
                 if not data['ok'] or not data['result']:
                     break
                 
                 batch_updates = data['result']
-                all_updates.extend(batch_updates)
+                self._remember_latest_messages(batch_updates)
+                fetched += len(batch_updates)
                 offset = batch_updates[-1]['update_id'] + 1
+                yield from batch_updates
                 
-                if len(all_updates) >= limit or len(batch_updates) < 100:
+                if len(batch_updates) < 100:
                     break
                     
         except Exception as e:
             print(f"Error fetching updates: {e}")
-        
-        return all_updates
+    
+    def get_all_updates(self, limit=100, offset=0):
+        """Get ALL available updates including historical ones"""
+        return list(self.iter_updates(limit=limit, offset=offset))
     
     def get_complete_message_history(self, chat_id=None, limit=1000):
         """Get complete message history with permission awareness"""
-        all_updates = self.get_all_updates(limit=limit)
         messages = []
         
-        bot_info = self.get_bot_info()
-        can_read_all = bot_info.get('result', {}).get('can_read_all_group_messages', False)
+        can_read_all = self.can_read_all
         
-        for update in all_updates:
-            message = update.get('message', {}) or update.get('channel_post', {})
+        # Filter page by page so updates from other chats are dropped as soon as they are read
+        target_chat = str(chat_id) if chat_id else None
+        append = messages.append
+        for update in self.iter_updates(limit=limit):
+            message = update.get('message') or update.get('channel_post')
             if not message:
                 continue
             
-            if chat_id and str(message['chat']['id']) != str(chat_id):
+            chat = message['chat']
+            if target_chat and str(chat['id']) != target_chat:
                 continue
             
+            text = message.get('text')
             # Check if this is a message the bot can actually see
             if not can_read_all:
                 # Bot can only see specific types of messages
                 is_visible = (
-                    message.get('text', '').startswith('/') or  # Commands
+                    (text or '').startswith('/') or  # Commands
                     'reply_to_message' in message or  # Replies
-                    message['chat']['type'] == 'private'  # Private chats
+                    chat['type'] == 'private'  # Private chats
                 )
                 if not is_visible:
                     continue
             
-            messages.append({
-                'update_id': update['update_id'],
-                'message': message,
-                'timestamp': message['date'],
-                'is_bot': message.get('from', {}).get('is_bot', False),
-                'direction': 'SENT' if message.get('from', {}).get('is_bot', False) else 'RECEIVED'
-            })
+            user = message.get('from', {})
+            is_bot = user.get('is_bot', False)
+            append(MessageRecord(
+                update_id=update['update_id'],
+                chat_id=chat['id'],
+                message_id=message['message_id'],
+                date=message['date'],
+                text=text,
+                user=user,
+                is_bot=is_bot,
+                direction='SENT' if is_bot else 'RECEIVED',
+                raw=message
+            ))
         
         return messages
     
+    def _remember_latest_messages(self, updates):
+        """Record the newest message_id per chat from a page of updates"""
+        for update in updates:
+            message = update.get('message') or update.get('channel_post')
+            if message:
+                chat_key = str(message['chat']['id'])
+                with self._latest_message_lock:
+                    self._latest_message_ids[chat_key] = max(message['message_id'],
+                                                             self._latest_message_ids.get(chat_key, 0))
+    
+    def _remember_sent_message(self, data):
+        """Record the message_id of a message the bot just sent"""
+        result = data.get('result')
+        if data.get('ok') and isinstance(result, dict) and 'chat' in result and 'message_id' in result:
+            self._remember_latest_messages([{'message': result}])
+        return data
+    
     def get_latest_message_id(self, chat_id):
-        """Get the latest message ID by sending a test message"""
-        test_response = self.send_message(chat_id, ".")
-        if test_response.get("ok"):
-            message_id = test_response['result']['message_id']
-            self.delete_message(chat_id, message_id)
-            return message_id
-        return None
+        """Get the newest message ID known for a chat
+        
+        Known ids come from the first 100 pending updates, anything the history views or
+        the monitor have read, and messages this bot sent. With more updates queued, or
+        messages from other bots, the result can be older than the chat's real latest message.
+        """
+        # Only the first page is read: requesting the next one would acknowledge
+        # (and so discard) the queued history that the display options rely on
+        for _ in self.iter_updates(limit=100, quiet=True):
+            pass
+        return self._latest_message_ids.get(str(chat_id))
     
     def send_message(self, chat_id, text):
         """Send a message to a chat"""
-        url = f"{self.base_url}/sendMessage"
-        data = {"chat_id": chat_id, "text": text}
-        try:
-            response = requests.post(url, data=data, timeout=self.timeout)
-            return response.json()
-        except Exception as e:
-            return {'ok': False, 'error': str(e)}
+        return self._remember_sent_message(self._call("sendMessage", chat_id=chat_id, text=text))
     
     def delete_message(self, chat_id, message_id):
         """Delete a message"""
-        url = f"{self.base_url}/deleteMessage"
-        data = {"chat_id": chat_id, "message_id": message_id}
-        try:
-            response = requests.post(url, data=data, timeout=self.timeout)
-            return response.json()
-        except Exception as e:
-            return {'ok': False, 'error': str(e)}
+        return self._call("deleteMessage", chat_id=chat_id, message_id=message_id)
     
-    def delete_messages_bulk(self, chat_id, start_message_id, count):
+    def _check_flood_wait(self, data):
+        """Pause the rate limiter when Telegram answers with 429 Too Many Requests"""
+        if not data.get('ok') and data.get('error_code') == 429:
+            retry_after = data.get('parameters', {}).get('retry_after', 1)
+            print(f"⏳ Rate limited by Telegram, pausing for {retry_after}s")
+            self._rate.pause(retry_after)
+        return data
+    
+    def delete_messages_bulk(self, chat_id, start_message_id, count, max_workers=16):
         """Delete multiple messages"""
-        processes = []
-        for i in range(count):
-            message_id = start_message_id - i
-            p = multiprocessing.Process(target=self._delete_single_message, 
-                                      args=(chat_id, message_id))
-            p.start()
-            processes.append(p)
-        
-        for p in processes:
-            p.join()
+        message_ids = range(start_message_id, start_message_id - count, -1)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            list(executor.map(lambda message_id: self._delete_single_message(chat_id, message_id),
+                              message_ids))
     
     def _delete_single_message(self, chat_id, message_id):
         """Helper method for bulk deletion"""
@@ -290,34 +505,48 @@ class TeleThreaty:
         else:
             print(f"✗ Failed to delete message {message_id}")
     
-    def spam_messages(self, chat_id, message, count=10):
+    def spam_messages(self, chat_id, message, count=10, max_workers=16):
         """Spam messages to a chat"""
-        processes = []
-        for _ in range(count):
-            p = multiprocessing.Process(target=self.send_message, 
-                                      args=(chat_id, message))
-            p.start()
-            processes.append(p)
-        
-        for p in processes:
-            p.join()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            list(executor.map(lambda _: self.send_message(chat_id, message), range(count)))
     
     def get_file_download_url(self, file_id):
         """Get download URL for a file"""
-        url = f"{self.base_url}/getFile"
-        params = {'file_id': file_id}
-        
-        try:
-            response = requests.get(url, params=params, timeout=self.timeout)
-            data = response.json()
+        def fetch():
+            url = self._urls["getFile"]
+            params = {'file_id': file_id}
             
-            if data['ok']:
-                file_path = data['result']['file_path']
-                return f"https://api.telegram.org/file/bot{self.token}/{file_path}"
-            return None
-        except Exception as e:
-            print(f"Error getting file URL: {e}")
-            return None
+            try:
+                response = self.session.get(url, params=params, timeout=self.timeout)
+                data = _loads(response.content)
+                
+                if data['ok']:
+                    file_path = data['result']['file_path']
+                    return f"{self.file_base_url}/{file_path}"
+                return None
+            except Exception as e:
+                print(f"Error getting file URL: {e}")
+                return None
+        return self._cached(('getFile', file_id), fetch)
+    
+    def get_file_download_urls(self, file_ids, max_workers=20):
+        """Resolve download URLs for many files concurrently"""
+        file_ids = list(dict.fromkeys(file_ids))
+        if not file_ids:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(file_ids))) as executor:
+            urls = executor.map(self.get_file_download_url, file_ids)
+            return dict(zip(file_ids, urls))
+    
+    def _message_file(self, message):
+        """Return (file_id, filename) for a message's document or largest photo"""
+        if 'document' in message:
+            doc = message['document']
+            return doc['file_id'], doc.get('file_name')
+        if 'photo' in message:
+            largest_photo = max(message['photo'], key=itemgetter('file_size'))
+            return largest_photo['file_id'], f"photo_{message['message_id']}.jpg"
+        return None
     
     def get_file_category(self, filename):
         """Get file category based on extension"""
@@ -325,10 +554,7 @@ class TeleThreaty:
             return "unknown"
         
         ext = os.path.splitext(filename)[1].lower()
-        for category, extensions in self.file_categories.items():
-            if ext in extensions:
-                return category
-        return "other"
+        return self._ext_to_category.get(ext, "other")
     
     def download_file(self, file_id, filename=None):
         """Download a file from Telegram"""
@@ -337,7 +563,7 @@ class TeleThreaty:
             return None
         
         try:
-            response = requests.get(download_url, stream=True, timeout=self.timeout)
+            response = self.session.get(download_url, stream=True, timeout=self.timeout)
             if response.status_code == 200:
                 if not filename:
                     content_disposition = response.headers.get('content-disposition', '')
@@ -347,7 +573,7 @@ class TeleThreaty:
                         extension = mimetypes.guess_extension(response.headers.get('content-type', '')) or '.bin'
                         filename = f"file_{file_id[:8]}{extension}"
                 
-                safe_filename = "".join(c for c in filename if c.isalnum() or c in '._- ').rstrip()
+                safe_filename = self._UNSAFE_FILENAME_CHARS.sub('', filename).rstrip()
                 
                 # Create category subdirectory
                 category = self.get_file_category(safe_filename)
@@ -356,9 +582,10 @@ class TeleThreaty:
                 
                 filepath = os.path.join(category_dir, safe_filename)
                 
+                # Copy straight from the socket in 1 MiB blocks
+                response.raw.decode_content = True
                 with open(filepath, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        f.write(chunk)
+                    shutil.copyfileobj(response.raw, f, length=1024 * 1024)
                 
                 return filepath
         except Exception as e:
@@ -366,6 +593,29 @@ class TeleThreaty:
         
         return None
     
+    def download_file_batch(self, files, max_workers=8):
+        """Download many (file_id, filename) pairs in parallel"""
+        # Files that would be saved under the same name are downloaded one after another,
+        # so a later one overwrites an earlier one instead of interleaving with it
+        groups = {}
+        for file_id, filename in dict.fromkeys(files):
+            target = self._UNSAFE_FILENAME_CHARS.sub('', filename).rstrip() if filename else file_id
+            groups.setdefault(target, []).append((file_id, filename))
+        
+        results = {}
+        if not groups:
+            return results
+        
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(groups))) as executor:
+            futures = [executor.submit(self._download_file_group, group) for group in groups.values()]
+            for future in as_completed(futures):
+                results.update(future.result())
+        return results
+    
+    def _download_file_group(self, files):
+        """Download (file_id, filename) pairs sequentially"""
+        return {(file_id, filename): self.download_file(file_id, filename) for file_id, filename in files}
+    
     def send_file(self, chat_id, file_path, caption=""):
         """Send a file to a chat"""
         try:
@@ -380,22 +630,13 @@ class TeleThreaty:
                 elif 'image' in mime_type:
                     file_type = 'photo'
             
-            file_type_methods = {
-                'document': 'sendDocument',
-                'photo': 'sendPhoto',
-                'audio': 'sendAudio',
-                'video': 'sendVideo',
-                'animation': 'sendAnimation',
-                'voice': 'sendVoice',
-                'video_note': 'sendVideoNote'
-            }
-            
-            url = f"{self.base_url}/{file_type_methods[file_type]}"
+            url = self._urls[self.FILE_SEND_METHODS[file_type]]
             with open(file_path, 'rb') as file:
                 files = {file_type: file}
                 data = {'chat_id': chat_id, 'caption': caption}
-                response = requests.post(url, files=files, data=data, timeout=self.timeout)
-                return response.json()
+                self._rate.acquire(chat_id)
+                response = self.session.post(url, files=files, data=data, timeout=self.timeout)
+                return self._remember_sent_message(self._check_flood_wait(_loads(response.content)))
         except Exception as e:
             return {'ok': False, 'error': str(e)}
     
@@ -405,25 +646,37 @@ class TeleThreaty:
     
     def parse_dict(self, title, dictionary):
         """Pretty print dictionary"""
-        result = f"{title}:\n"
+        parts = [f"{title}:\n"]
         for key, value in dictionary.items():
             if isinstance(value, dict):
-                result += '\n'.join(f"  {k}: {v}" for k, v in value.items())
+                parts.append('\n'.join(f"  {k}: {v}" for k, v in value.items()))
             else:
-                result += f"  {key}: {value}\n"
-        return result + "\n"
+                parts.append(f"  {key}: {value}\n")
+        parts.append("\n")
+        return "".join(parts)
+    
+    def _write_lines(self, lines, flush=False):
+        """Write buffered display lines to stdout in one call once enough have piled up"""
+        if lines and (flush or len(lines) >= 1000):
+            sys.stdout.write("\n".join(lines) + "\n")
+            lines.clear()
     
     def display_info(self, chat_id):
         """Display comprehensive bot and chat information"""
-        info = {
-            "Bot Information": self.get_bot_info(),
-            "Chat Information": self.get_chat_info(chat_id),
-            "Chat Administrators": self.get_chat_administrators(chat_id),
-            "Default Admin Rights": self.get_my_default_admin_rights(chat_id),
-            "Bot Commands": self.get_my_commands(chat_id),
-            "Member Count": self.get_chat_member_count(chat_id)
+        lookups = {
+            "Bot Information": (self.get_bot_info,),
+            "Chat Information": (self.get_chat_info, chat_id),
+            "Chat Administrators": (self.get_chat_administrators, chat_id),
+            "Default Admin Rights": (self.get_my_default_admin_rights, chat_id),
+            "Bot Commands": (self.get_my_commands, chat_id),
+            "Member Count": (self.get_chat_member_count, chat_id)
         }
         
+        # The lookups are independent, so issue them all at once
+        with ThreadPoolExecutor(max_workers=len(lookups)) as executor:
+            futures = {title: executor.submit(*call) for title, call in lookups.items()}
+            info = {title: future.result() for title, future in futures.items()}
+        
         for title, data in info.items():
             if data.get('ok'):
                 print(self.parse_dict(title, data['result']))
@@ -433,14 +686,13 @@ class TeleThreaty:
     def display_received_messages(self, chat_id=None, download_files=False, limit=1000):
         """Display received messages with enhanced file information"""
         messages = self.get_complete_message_history(chat_id, limit)
-        received_messages = [msg for msg in messages if msg['direction'] == 'RECEIVED']
+        received_messages = [msg for msg in messages if msg.direction == 'RECEIVED']
         
         print(f"\n{' RECEIVED MESSAGES ':=^60}")
         print(f"📊 Total messages found: {len(received_messages)}")
         
         # Check permissions and warn user
-        bot_info = self.get_bot_info()
-        can_read_all = bot_info.get('result', {}).get('can_read_all_group_messages', False)
+        can_read_all = self.can_read_all
         if not can_read_all:
             print("⚠️  Limited visibility: Privacy mode is enabled")
             print("📝 Only showing commands, replies, and private messages")
@@ -453,57 +705,65 @@ class TeleThreaty:
                 print("💡 Try disabling privacy mode with @BotFather to see all messages")
             return
         
-        for msg_data in received_messages:
-            message = msg_data['message']
-            user = message.get('from', {})
-            timestamp = self.format_timestamp(message['date'])
+        # Resolve all getFile lookups (and downloads) up front so their round-trips overlap
+        files = [self._message_file(msg.raw) for msg in received_messages if msg.text is None]
+        files = [file for file in files if file]
+        download_urls = self.get_file_download_urls([file_id for file_id, _ in files])
+        downloaded = self.download_file_batch(files) if download_files else {}
+        
+        out = []
+        for msg in received_messages:
+            message = msg.raw
+            user = msg.user
+            timestamp = self.format_timestamp(msg.date)
             
-            print(f"🕒 {timestamp}")
+            out.append(f"🕒 {timestamp}")
             if user:
-                print(f"👤 From: {user.get('first_name', '')} {user.get('last_name', '')}")
+                out.append(f"👤 From: {user.get('first_name', '')} {user.get('last_name', '')}")
                 if user.get('username'):
-                    print(f"   Username: @{user['username']}")
-                print(f"   User ID: {user['id']}")
-            print(f"   Chat ID: {message['chat']['id']}")
-            print(f"   Message ID: {message['message_id']}")
+                    out.append(f"   Username: @{user['username']}")
+                out.append(f"   User ID: {user['id']}")
+            out.append(f"   Chat ID: {msg.chat_id}")
+            out.append(f"   Message ID: {msg.message_id}")
             
             # Handle different content types with enhanced information
             file_info = None
-            if 'text' in message:
-                print(f"💬 Text: {message['text']}")
+            if msg.text is not None:
+                out.append(f"💬 Text: {msg.text}")
             elif 'document' in message:
                 doc = message['document']
                 file_ext = os.path.splitext(doc.get('file_name', ''))[1].lower()
                 file_category = self.get_file_category(doc.get('file_name'))
-                print(f"📄 Document: {doc.get('file_name', 'Unnamed')} ({doc.get('file_size', 0)} bytes)")
-                print(f"   🗃️  File type: {file_category.upper()}")
+                out.append(f"📄 Document: {doc.get('file_name', 'Unnamed')} ({doc.get('file_size', 0)} bytes)")
+                out.append(f"   🗃️  File type: {file_category.upper()}")
                 
-                download_url = self.get_file_download_url(doc['file_id'])
+                download_url = download_urls.get(doc['file_id'])
                 if download_url:
-                    print(f"   🔗 Download URL: {download_url}")
+                    out.append(f"   🔗 Download URL: {download_url}")
                 
-                if download_files:
-                    file_info = self.download_file(doc['file_id'], doc.get('file_name'))
+                file_info = downloaded.get((doc['file_id'], doc.get('file_name')))
             
             elif 'photo' in message:
-                print(f"🖼️  Photo: {len(message['photo'])} sizes available")
-                largest_photo = max(message['photo'], key=lambda x: x['file_size'])
-                download_url = self.get_file_download_url(largest_photo['file_id'])
+                out.append(f"🖼️  Photo: {len(message['photo'])} sizes available")
+                photo_file = self._message_file(message)
+                download_url = download_urls.get(photo_file[0])
                 if download_url:
-                    print(f"   🔗 Download URL: {download_url}")
+                    out.append(f"   🔗 Download URL: {download_url}")
                 
-                if download_files:
-                    file_info = self.download_file(largest_photo['file_id'], f"photo_{message['message_id']}.jpg")
+                file_info = downloaded.get(photo_file)
             
             if file_info:
-                print(f"   📥 Downloaded: {file_info}")
+                out.append(f"   📥 Downloaded: {file_info}")
             
-            print("-" * 40)
+            out.append("-" * 40)
+            self._write_lines(out)
+        
+        self._write_lines(out, flush=True)
     
     def display_sent_messages(self, chat_id=None, limit=1000):
         """Display messages sent by the bot"""
         messages = self.get_complete_message_history(chat_id, limit)
-        sent_messages = [msg for msg in messages if msg['direction'] == 'SENT']
+        sent_messages = [msg for msg in messages if msg.direction == 'SENT']
         
         print(f"\n{' SENT MESSAGES ':=^60}")
         print(f"📊 Total messages found: {len(sent_messages)}")
@@ -513,25 +773,28 @@ class TeleThreaty:
             print("🤖 No messages sent by the bot found")
             return
         
-        for msg_data in sent_messages:
-            message = msg_data['message']
-            user = message['from']
-            timestamp = self.format_timestamp(message['date'])
+        out = []
+        for msg in sent_messages:
+            message = msg.raw
+            timestamp = self.format_timestamp(msg.date)
             
-            print(f"🕒 {timestamp}")
-            print(f"🤖 Sent by: {user.get('first_name', 'Bot')}")
-            print(f"   To Chat ID: {message['chat']['id']}")
-            print(f"   Message ID: {message['message_id']}")
+            out.append(f"🕒 {timestamp}")
+            out.append(f"🤖 Sent by: {msg.user.get('first_name', 'Bot')}")
+            out.append(f"   To Chat ID: {msg.chat_id}")
+            out.append(f"   Message ID: {msg.message_id}")
             
-            if 'text' in message:
-                print(f"💬 Text: {message['text']}")
+            if msg.text is not None:
+                out.append(f"💬 Text: {msg.text}")
             elif 'photo' in message:
-                print(f"🖼️  Photo sent")
+                out.append(f"🖼️  Photo sent")
             elif 'document' in message:
                 doc = message['document']
-                print(f"📄 Document: {doc.get('file_name', 'Unnamed')}")
+                out.append(f"📄 Document: {doc.get('file_name', 'Unnamed')}")
             
-            print("-" * 40)
+            out.append("-" * 40)
+            self._write_lines(out)
+        
+        self._write_lines(out, flush=True)
     
     def display_all_messages(self, chat_id=None, limit=1000):
         """Display both received and sent messages in chronological order"""
@@ -541,8 +804,7 @@ class TeleThreaty:
         print(f"📊 Total messages: {len(messages)}")
         
         # Check permissions
-        bot_info = self.get_bot_info()
-        can_read_all = bot_info.get('result', {}).get('can_read_all_group_messages', False)
+        can_read_all = self.can_read_all
         if not can_read_all:
             print("⚠️  Limited visibility: Privacy mode is enabled")
         
@@ -553,31 +815,35 @@ class TeleThreaty:
             return
         
         # Sort by timestamp
-        sorted_messages = sorted(messages, key=lambda x: x['timestamp'])
+        messages.sort(key=attrgetter('date'))
         
-        for msg_data in sorted_messages:
-            message = msg_data['message']
-            user = message['from']
-            timestamp = self.format_timestamp(message['date'])
-            is_bot = msg_data['is_bot']
+        out = []
+        for msg in messages:
+            message = msg.raw
+            user = msg.user
+            timestamp = self.format_timestamp(msg.date)
+            is_bot = msg.is_bot
             
             direction = "➡️ SENT" if is_bot else "⬅️ RECEIVED"
             user_info = f"🤖 {user.get('first_name', 'Bot')}" if is_bot else f"👤 {user.get('first_name', '')}"
             
-            print(f"{direction} | 🕒 {timestamp}")
-            print(f"   {user_info}")
+            out.append(f"{direction} | 🕒 {timestamp}")
+            out.append(f"   {user_info}")
             if not is_bot and user.get('username'):
-                print(f"   Username: @{user['username']}")
-            print(f"   Chat ID: {message['chat']['id']}")
-            print(f"   Message ID: {message['message_id']}")
+                out.append(f"   Username: @{user['username']}")
+            out.append(f"   Chat ID: {msg.chat_id}")
+            out.append(f"   Message ID: {msg.message_id}")
             
-            if 'text' in message:
-                print(f"💬 {message['text']}")
+            if msg.text is not None:
+                out.append(f"💬 {msg.text}")
             else:
                 content_type = next((key for key in ['photo', 'document', 'audio', 'video', 'sticker'] if key in message), 'unknown')
-                print(f"📦 {content_type.capitalize()} content")
+                out.append(f"📦 {content_type.capitalize()} content")
             
-            print("-" * 40)
+            out.append("-" * 40)
+            self._write_lines(out)
+        
+        self._write_lines(out, flush=True)
     
     def download_all_messages(self, chat_id, output_dir="message_archive"):
         """Download all messages with complete metadata"""
@@ -585,18 +851,26 @@ class TeleThreaty:
         messages = self.get_complete_message_history(chat_id, limit=10000)
         
         # Save as JSON
-        with open(os.path.join(output_dir, "messages.json"), 'w') as f:
-            json.dump(messages, f, indent=2, default=str)
+        json_path = os.path.join(output_dir, "messages.json")
+        archive = [msg.to_archive() for msg in messages]
+        if orjson:
+            with open(json_path, 'wb') as f:
+                f.write(orjson.dumps(archive, option=orjson.OPT_INDENT_2, default=str))
+        else:
+            with open(json_path, 'w') as f:
+                json.dump(archive, f, indent=2, default=str)
         
         # Save as text
+        parts = []
+        for msg in messages:
+            parts.append(f"Message ID: {msg.message_id}\n")
+            parts.append(f"Timestamp: {self.format_timestamp(msg.date)}\n")
+            parts.append(f"Direction: {msg.direction}\n")
+            if msg.text is not None:
+                parts.append(f"Text: {msg.text}\n")
+            parts.append("\n")
         with open(os.path.join(output_dir, "messages.txt"), 'w') as f:
-            for msg in messages:
-                f.write(f"Message ID: {msg['message']['message_id']}\n")
-                f.write(f"Timestamp: {self.format_timestamp(msg['message']['date'])}\n")
-                f.write(f"Direction: {msg['direction']}\n")
-                if 'text' in msg['message']:
-                    f.write(f"Text: {msg['message']['text']}\n")
-                f.write("\n")
+            f.write("".join(parts))
         
         print(f"📁 Messages archived to {output_dir}/")
         return len(messages)
@@ -607,28 +881,30 @@ class TeleThreaty:
         print("🔍 Monitoring for new messages... (Ctrl+C to stop)")
         
         # Check permissions
-        bot_info = self.get_bot_info()
-        can_read_all = bot_info.get('result', {}).get('can_read_all_group_messages', False)
+        can_read_all = self.can_read_all
         if not can_read_all:
             print("⚠️  Limited monitoring: Privacy mode is enabled")
             print("📝 Only monitoring commands, replies, and private messages")
         
         try:
             while True:
-                url = f"{self.base_url}/getUpdates?timeout=30"
-                if offset:
-                    url += f"&offset={offset}"
+                # Telegram holds the request open until an update arrives, so no local sleep is needed
+                params = {
+                    'offset': offset,
+                    'timeout': 50,
+                    'allowed_updates': json.dumps(['message', 'channel_post'])
+                }
                 
-                response = requests.get(url, timeout=35)
-                data = response.json()
+                response = self.session.get(self._urls["getUpdates"], params=params,
+                                            timeout=(self.timeout[0], 55))
+                data = _loads(response.content)
                 
                 if data.get('ok') and data.get('result'):
+                    self._remember_latest_messages(data['result'])
                     for update in data['result']:
                         print("New Update:")
                         pprint.pprint(update, indent=2, width=80)
                         offset = update['update_id'] + 1
-                
-                time.sleep(1)
         except KeyboardInterrupt:
             print("\nMonitoring stopped.")
     
@@ -637,101 +913,142 @@ class TeleThreaty:
         # Check permissions first
         self.check_bot_permissions(chat_id)
         
+        handlers = {
+            '1': self.display_info,
+            '2': self._menu_received_messages,
+            '3': self._menu_sent_messages,
+            '4': self._menu_all_messages,
+            '5': self._menu_download_all,
+            '6': self.monitor_messages,
+            '7': self._menu_send_message,
+            '8': self._menu_spam_messages,
+            '9': self._menu_delete_messages,
+            '10': self._menu_send_file,
+            '11': self._menu_message_count,
+            '12': lambda chat_id: self.check_bot_permissions(chat_id, refresh=True),
+        }
+        
+        # The menu is rendered once and written with a single call per iteration
+        menu = "\n".join([
+            "\n" + "="*50,
+            " TELETHREATY BOT - MAIN MENU",
+            "="*50,
+            "1. 📋 Display Bot & Chat Information",
+            "2. 📥 Show Received Messages",
+            "3. 📤 Show Sent Messages",
+            "4. 📋 Show All Messages",
+            "5. 💾 Download All Messages (Archive)",
+            "6. 🔍 Monitor Messages in Real-time",
+            "7. 📩 Send Message",
+            "8. 🚫 Spam Messages",
+            "9. 🗑️  Delete Messages",
+            "10. 📤 Send File",
+            "11. 📊 Get Message Count",
+            "12. 🔄 Check Permissions Again",
+            "13. ❌ Exit",
+            "="*50
+        ]) + "\n"
+        
         while True:
-            print("\n" + "="*50)
-            print(" TELETHREATY BOT - MAIN MENU")
-            print("="*50)
-            print("1. 📋 Display Bot & Chat Information")
-            print("2. 📥 Show Received Messages")
-            print("3. 📤 Show Sent Messages")
-            print("4. 📋 Show All Messages")
-            print("5. 💾 Download All Messages (Archive)")
-            print("6. 🔍 Monitor Messages in Real-time")
-            print("7. 📩 Send Message")
-            print("8. 🚫 Spam Messages")
-            print("9. 🗑️  Delete Messages")
-            print("10. 📤 Send File")
-            print("11. 📊 Get Message Count")
-            print("12. 🔄 Check Permissions Again")
-            print("13. ❌ Exit")
-            print("="*50)
+            sys.stdout.write(menu)
+            sys.stdout.flush()
             
             choice = input("\nEnter your choice (1-13): ").strip()
             
-            if choice == '1':
-                self.display_info(chat_id)
-            
-            elif choice == '2':
-                limit = input("Limit (default 1000): ").strip() or "1000"
-                download = input("Download files? (y/n): ").strip().lower() == 'y'
-                self.display_received_messages(chat_id, download, int(limit))
-            
-            elif choice == '3':
-                limit = input("Limit (default 1000): ").strip() or "1000"
-                self.display_sent_messages(chat_id, int(limit))
-            
-            elif choice == '4':
-                limit = input("Limit (default 1000): ").strip() or "1000"
-                self.display_all_messages(chat_id, int(limit))
-            
-            elif choice == '5':
-                count = self.download_all_messages(chat_id)
-                print(f"Downloaded {count} messages to archive")
-            
-            elif choice == '6':
-                self.monitor_messages(chat_id)
-            
-            elif choice == '7':
-                message = input("Enter message to send: ")
-                result = self.send_message(chat_id, message)
-                pprint.pprint(result)
-            
-            elif choice == '8':
-                message = input("Enter spam message: ")
-                count = input("Number of messages (default 10): ").strip() or "10"
-                self.spam_messages(chat_id, message, int(count))
-                print("Spamming completed!")
-            
-            elif choice == '9':
-                latest_id = self.get_latest_message_id(chat_id)
-                if latest_id:
-                    count = input(f"Number to delete (latest is {latest_id}): ").strip() or "10"
-                    self.delete_messages_bulk(chat_id, latest_id, int(count))
-                else:
-                    print("Could not get latest message ID")
-            
-            elif choice == '10':
-                file_path = input("Enter file path: ").strip()
-                if os.path.exists(file_path):
-                    caption = input("Caption (optional): ").strip()
-                    result = self.send_file(chat_id, file_path, caption)
-                    pprint.pprint(result)
-                else:
-                    print("File not found!")
-            
-            elif choice == '11':
-                latest_id = self.get_latest_message_id(chat_id)
-                if latest_id:
-                    print(f"Approximate message count: {latest_id}")
-                else:
-                    print("Could not get message count")
-            
-            elif choice == '12':
-                self.check_bot_permissions(chat_id)
-            
-            elif choice == '13':
+            if choice == '13':
                 print("Goodbye!")
                 break
             
+            handler = handlers.get(choice)
+            if handler:
+                handler(chat_id)
             else:
                 print("Invalid choice!")
+    
+    def _menu_received_messages(self, chat_id):
+        """Prompt for options and show received messages"""
+        limit = input("Limit (default 1000): ").strip() or "1000"
+        download = input("Download files? (y/n): ").strip().lower() == 'y'
+        self.display_received_messages(chat_id, download, int(limit))
+    
+    def _menu_sent_messages(self, chat_id):
+        """Prompt for a limit and show sent messages"""
+        limit = input("Limit (default 1000): ").strip() or "1000"
+        self.display_sent_messages(chat_id, int(limit))
+    
+    def _menu_all_messages(self, chat_id):
+        """Prompt for a limit and show all messages"""
+        limit = input("Limit (default 1000): ").strip() or "1000"
+        self.display_all_messages(chat_id, int(limit))
+    
+    def _menu_download_all(self, chat_id):
+        """Archive all messages and report the count"""
+        count = self.download_all_messages(chat_id)
+        print(f"Downloaded {count} messages to archive")
+    
+    def _menu_send_message(self, chat_id):
+        """Prompt for and send a single message"""
+        message = input("Enter message to send: ")
+        result = self.send_message(chat_id, message)
+        pprint.pprint(result)
+    
+    def _menu_spam_messages(self, chat_id):
+        """Prompt for a message and repeat count, then spam it"""
+        message = input("Enter spam message: ")
+        count = input("Number of messages (default 10): ").strip() or "10"
+        self.spam_messages(chat_id, message, int(count))
+        print("Spamming completed!")
+    
+    def _menu_delete_messages(self, chat_id):
+        """Prompt for a count and bulk-delete the latest messages"""
+        latest_id = self.get_latest_message_id(chat_id)
+        if latest_id:
+            print("💡 The latest ID comes from updates the bot has seen and may trail newer messages")
+            count = input(f"Number to delete (latest is {latest_id}): ").strip() or "10"
+            self.delete_messages_bulk(chat_id, latest_id, int(count))
+        else:
+            print("Could not get latest message ID")
+    
+    def _menu_send_file(self, chat_id):
+        """Prompt for a file path and caption, then send the file"""
+        file_path = input("Enter file path: ").strip()
+        if os.path.exists(file_path):
+            caption = input("Caption (optional): ").strip()
+            result = self.send_file(chat_id, file_path, caption)
+            pprint.pprint(result)
+        else:
+            print("File not found!")
+    
+    def _menu_message_count(self, chat_id):
+        """Show the approximate message count"""
+        latest_id = self.get_latest_message_id(chat_id)
+        if latest_id:
+            print(f"Approximate message count: {latest_id}")
+        else:
+            print("Could not get message count")
+
+# KEY=value lines with optional quotes and trailing " # comment"; exactly one of groups 2-4 matches
+_ENV_LINE = re.compile(
+    r'^[ \t]*([A-Za-z_][A-Za-z0-9_]*)[ \t]*=[ \t]*'
+    r'''(?:"([^"\n]*)"|'([^'\n]*)'|([^\n]*?))'''
+    r'[ \t\r]*(?:[ \t]#[^\n]*)?$', re.MULTILINE)
+
+# One client per token, so re-entering main() keeps its connection pool and caches
+_BOTS = {}
+
+def get_bot(token):
+    """Return the shared TeleThreaty client for token, creating it on first use"""
+    bot = _BOTS.get(token)
+    if bot is None:
+        bot = _BOTS[token] = TeleThreaty(token)
+    return bot
 
 def load_env_file():
     """Load environment variables from .env file"""
-    env_vars = {}
-    env_file = Path(".env")
-    
-    if not env_file.exists():
+    try:
+        with open(".env", 'rb') as f:
+            text = f.read().decode('utf-8', errors='replace')
+    except FileNotFoundError:
         print("❌ Error: .env file not found!")
         print("💡 Create a .env file with:")
         print("   TELEGRAM_BOT_TOKEN=your_bot_token_here")
@@ -739,33 +1056,43 @@ def load_env_file():
         sys.exit(1)
     
     print("📁 Loading environment from: .env")
-    with open(env_file, 'r') as f:
-        for line in f:
-            line = line.strip()
-            if line and not line.startswith('#') and '=' in line:
-                key, value = line.split('=', 1)
-                env_vars[key.strip()] = value.strip().strip('"').strip("'")
-    
-    return env_vars
+    return {match.group(1): match.group(match.lastindex) for match in _ENV_LINE.finditer(text)}
+
+def _warm_dns(host="api.telegram.org"):
+    """Resolve the API host so the lookup overlaps with reading configuration"""
+    try:
+        socket.getaddrinfo(host, 443, type=socket.SOCK_STREAM)
+    except OSError:
+        pass
 
 def main():
-    # Load environment variables
-    env_vars = load_env_file()
+    # Start resolving the API host while the configuration is read
+    threading.Thread(target=_warm_dns, daemon=True).start()
     
-    # Get configuration
-    token = env_vars.get('TELEGRAM_BOT_TOKEN')
-    chat_id = env_vars.get('TELEGRAM_CHAT_ID')
+    # Get configuration, only reading .env for values not already exported
+    token = os.environ.get('TELEGRAM_BOT_TOKEN')
+    chat_id = os.environ.get('TELEGRAM_CHAT_ID')
+    if not (token and chat_id):
+        env_vars = load_env_file()
+        token = token or env_vars.get('TELEGRAM_BOT_TOKEN')
+        chat_id = chat_id or env_vars.get('TELEGRAM_CHAT_ID')
     
     if not token:
-        print("❌ Error: TELEGRAM_BOT_TOKEN is required in .env file")
+        print("❌ Error: TELEGRAM_BOT_TOKEN is required in the environment or .env file")
         sys.exit(1)
     
     if not chat_id:
-        print("❌ Error: TELEGRAM_CHAT_ID is required in .env file")
+        print("❌ Error: TELEGRAM_CHAT_ID is required in the environment or .env file")
         sys.exit(1)
     
+    # Numeric ids are passed around as ints; channel @usernames stay strings
+    try:
+        chat_id = int(chat_id)
+    except ValueError:
+        pass
+    
     # Initialize bot
-    bot = TeleThreaty(token)
+    bot = get_bot(token)
     
     # Test connection
     bot_info = bot.get_bot_info()
@@ -773,7 +1100,8 @@ def main():
         print(f"❌ Error: Invalid bot token")
         sys.exit(1)
     
-    print(f"🤖 Connected to: {bot_info['result']['first_name']} (@{bot_info['result']['username']})")
+    bot_data = bot_info['result']
+    print(f"🤖 Connected to: {bot_data['first_name']} (@{bot_data['username']})")
     print(f"💬 Chat ID: {chat_id}")
     
     # Start interactive menu